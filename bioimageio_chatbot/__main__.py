@@ -39,6 +39,10 @@ def create_knowledge_base(args):
     from bioimageio_chatbot.knowledge_base import create_vector_knowledge_base
     create_vector_knowledge_base(args.output_dir)
 
+def rebuild_knowledge_base_index(args):
+    from bioimageio_chatbot.knowledge_base import rebuild_knowledge_base_index
+    rebuild_knowledge_base_index(args.knowledge_base_path, index_factory=args.index_factory, metric=args.metric, min_recall=args.min_recall)
+
 def init(args):
     knowledge_base_path = os.environ.get("BIOIMAGEIO_KNOWLEDGE_BASE_PATH", "./bioimageio-knowledge-base")
     assert knowledge_base_path is not None, "Please set the BIOIMAGEIO_KNOWLEDGE_BASE_PATH environment variable to the path of the knowledge base."
@@ -78,6 +82,14 @@ def main():
     parser_create_kb = subparsers.add_parser("create-knowledge-base")
     parser_create_kb.add_argument("--output-dir", default="./bioimageio-knowledge-base")
     parser_create_kb.set_defaults(func=create_knowledge_base)
+
+    # Rebuild knowledge base index command
+    parser_rebuild_index = subparsers.add_parser("rebuild-knowledge-base-index")
+    parser_rebuild_index.add_argument("--knowledge-base-path", default="./bioimageio-knowledge-base")
+    parser_rebuild_index.add_argument("--index-factory", default="IVF256,PQ32")
+    parser_rebuild_index.add_argument("--metric", choices=["l2", "inner_product"], default="l2")
+    parser_rebuild_index.add_argument("--min-recall", type=float, default=0.9)
+    parser_rebuild_index.set_defaults(func=rebuild_knowledge_base_index)
     
     args = parser.parse_args()
     if hasattr(args, 'func'):
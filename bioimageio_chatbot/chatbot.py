@@ -93,6 +93,8 @@ def create_assistants(builtin_extensions):
         tools = []
         tool_prompts = {}
         ext_states = []
+        max_length = 4000
+        extensions = []
         for ext in question_with_history.chatbot_extensions:
             if "id" in ext and ext["id"] in extensions_by_id:
                 extension = extensions_by_id[ext["id"]]
@@ -105,26 +107,42 @@ def create_assistants(builtin_extensions):
                     logger.warning(f"Legacy chatbot extension is deprecated. Please use the new ChatbotExtension interface for {extension.name} with multi-tool support.")
                 else:
                     extension = ChatbotExtension.model_validate(ext)
-
-            max_length = 4000
             if isinstance(extension, LegacyChatbotExtension):
-                ts = [await legacy_extension_to_tool(extension)]
                 assert len(extension.description) <= max_length, f"Extension description is too long: {extension.description}"
-                tool_prompts[create_tool_name(extension.name)] = extension.description.replace("\n", ";")[:max_length]
             else:
-                ts = await extension_to_tools(extension)
                 assert len(extension.description) <= max_length, f"Extension tool prompt is too long: {extension.description}"
+            extensions.append(extension)
+
+        async def convert_extension(extension):
+            if isinstance(extension, LegacyChatbotExtension):
+                return [await legacy_extension_to_tool(extension)]
+            return await extension_to_tools(extension)
+
+        async def get_extension_state(extension):
+            get_state = getattr(extension, "get_state", None)
+            if get_state:
+                return await get_state()
+            return None
+
+        # the extensions may be remote services, convert them and get their states concurrently
+        ext_tools, states_list = await asyncio.gather(
+            asyncio.gather(*[convert_extension(extension) for extension in extensions]),
+            asyncio.gather(*[get_extension_state(extension) for extension in extensions]),
+        )
+        for extension, ts, states in zip(extensions, ext_tools, states_list):
+            if isinstance(extension, LegacyChatbotExtension):
+                tool_prompts[create_tool_name(extension.name)] = extension.description.replace("\n", ";")[:max_length]
+            else:
                 tool_prompts[create_tool_name(extension.id) + "*"] = extension.description.replace("\n", ";")[:max_length]
             extensions_by_tool_name.update({t.__name__: extension for t in ts})
             
-            if extension.info:
+            if getattr(extension, "info", None):
                 for t in ts:
                     tool_info[t.__name__] = extension.info.get(t.__tool_id__)
 
             tools += ts
-            if extension.get_state:
+            if states is not None:
                 # the state of the extension is a dictionary with keys and values for the states of the extension
-                states = await extension.get_state()
                 assert isinstance(states, dict), f"Extension {extension.name} state must be a dictionary."
                 # each state may be a multi-line string so we need to create a code block for each state
                 state_prompt = "## " + extension.name + "\n"
@@ -75,10 +75,7 @@ async def extension_to_tools(extension: ChatbotExtension):
 
 async def main():
     extensions = get_builtin_extensions()
-    tools = []
-    for svc in extensions:
-        tool = await extension_to_tools(svc)
-        tools.append(tool)
+    tools = await asyncio.gather(*[extension_to_tools(svc) for svc in extensions])
     print(tools)
 
 if __name__ == "__main__":
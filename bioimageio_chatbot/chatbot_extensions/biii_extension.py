@@ -1,4 +1,5 @@
 import asyncio
+import concurrent.futures
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
@@ -7,6 +8,10 @@ from pydantic import BaseModel, Field
 from bioimageio_chatbot.utils import ChatbotExtension
 from schema_agents import schema_tool
 
+BIII_SEARCH_TIMEOUT = 30
+# Scraping biii.eu is slow and blocking, keep it away from the default executor used by other extensions
+biii_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="biii")
+
 class BiiiQuery(BaseModel):
     """Queries parameters for biii.eu search"""
 
@@ -94,7 +99,7 @@ def search_biii_with_links(
 
     for query in queries:
         url = search_base_url + ",".join(query.split())
-        response = requests.get(url)
+        response = requests.get(url, timeout=BIII_SEARCH_TIMEOUT)
         soup = BeautifulSoup(response.text, "html.parser")
         tables = soup.find_all("table")
 
@@ -144,9 +149,15 @@ async def search_biii(
     print(f"Searching biii.eu with keywords: {keywords}, top_k: {top_k}")
     loop = asyncio.get_running_loop()
     # steps.append(ResponseStep(name="Search on biii.eu", details=dict()))
-    results = await loop.run_in_executor(
-        None, search_biii_with_links, keywords, "software", ""
-    )
+    try:
+        results = await asyncio.wait_for(
+            loop.run_in_executor(
+                biii_pool, search_biii_with_links, keywords, "software", ""
+            ),
+            timeout=BIII_SEARCH_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        return f"Sorry, the search on biii.eu about {keywords} timed out, please try again later."
     if results:
         results = BiiiSearchResult(
             results=results[: top_k],
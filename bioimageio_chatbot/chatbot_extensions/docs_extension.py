@@ -1,71 +1,120 @@
 import os
 import asyncio
+import heapq
+import logging
+import concurrent.futures
 from functools import partial
-from pydantic import BaseModel, Field
+from pydantic import Field
 from typing import Any, Dict, Optional
-from bioimageio_chatbot.knowledge_base import load_knowledge_base
+from bioimageio_chatbot.knowledge_base import load_knowledge_base, get_docs_store, embed_query
 from bioimageio_chatbot.utils import get_manifest
 from bioimageio_chatbot.utils import ChatbotExtension
+from bioimageio_chatbot.chatbot_extensions.query_cache import QueryCache
 from schema_agents import schema_tool
 
-class DocWithScore(BaseModel):
-    """A document with an associated relevance score."""
+logger = logging.getLogger("bioimageio-chatbot")
 
-    doc: str = Field(description="The document retrieved.")
-    score: float = Field(description="The relevance score of the retrieved document.")
+# Results below this relevance score are not returned to the assistant
+MIN_RELEVANCE = float(os.environ.get("BIOIMAGEIO_MIN_RELEVANCE", "0.2"))
+# Cache retrieval results keyed by (channel_id, normalized query, top_k)
+query_cache = QueryCache(max_size=2000, ttl=300.0)
+# Dedicated pool for FAISS searches, FAISS releases the GIL so searches run in parallel
+faiss_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix="faiss"
+)
 
+def search_with_relevance_scores(load_docs_store, embedding, top_k):
+    docs_store = load_docs_store()
+    relevance_score_fn = docs_store._select_relevance_score_fn()
+    docs_and_scores = docs_store.similarity_search_with_score_by_vector(embedding, k=top_k)
+    return [(doc, relevance_score_fn(score)) for doc, score in docs_and_scores]
 
-async def run_extension(
-    docs_store_dict,
+
+async def search_docs_store(
+    docs_store_loaders,
     channel_id,
-    query: str = Field(
-        description="The query used to retrieve documents related to the user's request. It should be a sentence which will be used to match descriptions using the OpenAI text embedding to match document chunks in a vector database."
-    ),
-    top_k: int = Field(
-        3,
-        description="The maximum number of search results to return. Should use a small number to avoid overwhelming the user.",
-    ),
+    query: str,
+    top_k: int = 3,
+    base_url: Optional[str] = None,
 ):
-    channel_results = []
-    # channel_urls = []
     # limit top_k from 1 to 15
     top_k = max(1, min(top_k, 15))
-    docs_store = docs_store_dict[channel_id]
-
-    print(f"Retrieving documents from database {channel_id} with query: {query}")
-    channel_results.append(
-        await docs_store.asimilarity_search_with_relevance_scores(
-            query, k=top_k
-        )
+    cache_key = (channel_id, query.strip().lower(), top_k)
+    results = query_cache.get(cache_key)
+    if results is not None:
+        return results
+    if channel_id is None:
+        # search all the channels concurrently and merge the results below
+        channel_ids = list(docs_store_loaders.keys())
+    else:
+        channel_ids = [channel_id]
+
+    logger.debug("Retrieving documents from database %s with query: %s", channel_id or "all", query)
+    loop = asyncio.get_running_loop()
+    # Embed the query once for all the channels
+    embedding = await loop.run_in_executor(None, embed_query, query.strip())
+    # Loading and searching FAISS stores is blocking, run it in the FAISS pool to search channels in parallel
+    channel_results = await asyncio.gather(
+        *[
+            loop.run_in_executor(
+                faiss_pool, search_with_relevance_scores, docs_store_loaders[cid], embedding, top_k
+            )
+            for cid in channel_ids
+        ],
+        return_exceptions=True,
     )
+    results_by_channel = []
+    errors = []
+    for cid, results_with_scores in zip(channel_ids, channel_results):
+        if isinstance(results_with_scores, Exception):
+            # skip the channels that failed to load, the other channels can still answer
+            logger.warning("Failed to search docs store %s: %s", cid, results_with_scores)
+            errors.append(results_with_scores)
+        else:
+            results_by_channel.append([(doc, score, cid) for doc, score in results_with_scores])
+    if errors and not results_by_channel:
+        raise errors[0]
 
-    docs_with_score = [
-        DocWithScore(
-            doc=doc.page_content,
-            score=round(score, 2),
-            metadata=doc.metadata,  # , base_url=base_url
-        )
-        for results_with_scores in channel_results
-        for doc, score in results_with_scores
-    ]
-    # sort by relevance score
-    docs_with_score = sorted(docs_with_score, key=lambda x: x.score, reverse=True)[
-        : top_k
-    ]
-
-    if len(docs_with_score) > 2:
-        print(
-            f"Retrieved documents:\n{docs_with_score[0].doc[:20] + '...'} (score: {docs_with_score[0].score})\n{docs_with_score[1].doc[:20] + '...'} (score: {docs_with_score[1].score})\n{docs_with_score[2].doc[:20] + '...'} (score: {docs_with_score[2].score})"
+    if len(results_by_channel) == 1:
+        # FAISS already returns the top_k results of a single channel sorted by score
+        docs_and_scores = results_by_channel[0][:top_k]
+    else:
+        # merge the top_k results of all the channels by relevance score
+        docs_and_scores = heapq.nlargest(
+            top_k,
+            (doc_and_score for results_with_scores in results_by_channel for doc_and_score in results_with_scores),
+            key=lambda x: x[1],
         )
+    if not docs_and_scores or docs_and_scores[0][1] < MIN_RELEVANCE:
+        # skip sending irrelevant documents to the assistant
+        results = {"docs": ["No relevant documentation found."], "scores": [0.0], "metadatas": [{}], "channels": [channel_id], "base_url": base_url}
     else:
-        print(f"Retrieved documents:\n{docs_with_score}")
-    return docs_with_score
+        # return the results as parallel lists instead of one object per document
+        results = {
+            "docs": [doc.page_content for doc, _, _ in docs_and_scores],
+            "scores": [round(float(score), 2) for _, score, _ in docs_and_scores],
+            "metadatas": [doc.metadata for doc, _, _ in docs_and_scores],
+            "channels": [cid for _, _, cid in docs_and_scores],
+            "base_url": base_url,
+        }
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Retrieved top-%d from %s: %s",
+            top_k,
+            channel_id or "all",
+            [(doc[:20], score) for doc, score in zip(results["docs"], results["scores"])],
+        )
+    if not errors:
+        # the failures may be transient, do not serve the partial results of the failed channels from the cache
+        query_cache.put(cache_key, results)
+    return results
 
 
 def title_case(s):
     return s.replace(".", " ").replace("-", " ").title().replace(" ", "")
 
-def create_tool(docs_store_dict, collection):
+def create_tool(docs_store_loaders, collection):
     async def run_extension(
         query: str = Field(
             description="The query used to retrieve documents related to the user's request. It should be a sentence which will be used to match descriptions using the OpenAI text embedding to match document chunks in a vector database."
@@ -75,40 +124,7 @@ def create_tool(docs_store_dict, collection):
             description="The maximum number of search results to return. Should use a small number to avoid overwhelming the user.",
         ),
     ):
-        channel_results = []
-        # channel_urls = []
-        # limit top_k from 1 to 15
-        top_k = max(1, min(top_k, 15))
-        docs_store = docs_store_dict[collection["id"]]
-
-        print(f"Retrieving documents from database {collection['id']} with query: {query}")
-        channel_results.append(
-            await docs_store.asimilarity_search_with_relevance_scores(
-                query, k=top_k
-            )
-        )
-
-        docs_with_score = [
-            DocWithScore(
-                doc=doc.page_content,
-                score=round(score, 2),
-                metadata=doc.metadata,  # , base_url=base_url
-            )
-            for results_with_scores in channel_results
-            for doc, score in results_with_scores
-        ]
-        # sort by relevance score
-        docs_with_score = sorted(docs_with_score, key=lambda x: x.score, reverse=True)[
-            : top_k
-        ]
-
-        if len(docs_with_score) > 2:
-            print(
-                f"Retrieved documents:\n{docs_with_score[0].doc[:20] + '...'} (score: {docs_with_score[0].score})\n{docs_with_score[1].doc[:20] + '...'} (score: {docs_with_score[1].score})\n{docs_with_score[2].doc[:20] + '...'} (score: {docs_with_score[2].score})"
-            )
-        else:
-            print(f"Retrieved documents:\n{docs_with_score}")
-        return docs_with_score
+        return await search_docs_store(docs_store_loaders, collection["id"], query, top_k, base_url=collection.get("base_url"))
 
     channel_id = collection["id"]
     base_url = collection.get("base_url")
@@ -126,6 +142,29 @@ def create_tool(docs_store_dict, collection):
     run_extension.__doc__ = f"""Searching documentation for {channel_id}: {collection['description']}.{base_url_prompt}. {reference_prompt}"""
     return schema_tool(run_extension)
 
+def create_search_all_tool(docs_store_loaders, collections):
+    async def run_extension(
+        query: str = Field(
+            description="The query used to retrieve documents related to the user's request. It should be a sentence which will be used to match descriptions using the OpenAI text embedding to match document chunks in a vector database."
+        ),
+        top_k: int = Field(
+            3,
+            description="The maximum number of search results to return. Should use a small number to avoid overwhelming the user.",
+        ),
+    ):
+        return await search_docs_store(docs_store_loaders, None, query, top_k)
+
+    channels_prompt = ""
+    for col in collections:
+        channels_prompt += f"\n - {col['id']}"
+        if col.get("base_url"):
+            channels_prompt += f": documentation available at {col['base_url']}"
+        if col.get("reference"):
+            channels_prompt += f", reference: {col['reference']}"
+    run_extension.__name__ = "SearchAllDocs"
+    run_extension.__doc__ = f"""Searching all the documentation at once and returning the most relevant documents, `channels` gives the documentation each document comes from. Use it when it is unclear which documentation contains the answer. The documentations are:{channels_prompt}"""
+    return schema_tool(run_extension)
+
 INFO_KEYS = ["name","description", "authors", "license", "reference"]
 
 def get_extension():
@@ -142,26 +181,40 @@ def get_extension():
         )
         os.makedirs(knowledge_base_path, exist_ok=True)
 
-    knowledge_base_path = os.environ.get(
-        "BIOIMAGEIO_KNOWLEDGE_BASE_PATH", "./bioimageio-knowledge-base"
-    )
-    docs_store_dict = load_knowledge_base(knowledge_base_path)
-    
+    if os.environ.get("BIOIMAGEIO_PRELOAD_KNOWLEDGE_BASE") == "true":
+        load_knowledge_base(knowledge_base_path, collections)
+    # docs stores are loaded on their first search
+    docs_store_loaders = {
+        col["id"]: partial(get_docs_store, knowledge_base_path, col["id"])
+        for col in collections
+    }
+
     docs_tools = {}
     docs_info = {}
     books_tools = {}
     books_info = {}
+    docs_collections = []
     for col in collections:
         info = {k: col[k] for k in INFO_KEYS if k in col}
         if "book" in col["id"]:
-            books_tools["search_" + col["id"]] = create_tool(docs_store_dict, col)
+            books_tools["search_" + col["id"]] = create_tool(docs_store_loaders, col)
             if info:
                 books_info["search_" + col["id"]] = info
         else:
-            docs_tools["search_" + col["id"]] = create_tool(docs_store_dict, col)
+            docs_tools["search_" + col["id"]] = create_tool(docs_store_loaders, col)
             if info:
                 docs_info["search_" + col["id"]] = info
-            
+            if all(
+                os.path.exists(os.path.join(knowledge_base_path, f"{col['id']}.{ext}"))
+                for ext in ["faiss", "pkl"]
+            ):
+                docs_collections.append(col)
+
+    if docs_collections:
+        docs_tools["search_all"] = create_search_all_tool(
+            {col["id"]: docs_store_loaders[col["id"]] for col in docs_collections},
+            docs_collections,
+        )
 
     if docs_tools:
         sinfo1 = ChatbotExtension(
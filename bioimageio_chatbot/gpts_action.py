@@ -8,8 +8,11 @@ client = AsyncOpenAI()
 
 async def convert_extensions(builtin_extensions):
     extension_services = {}
-    for extension in builtin_extensions:
-        tools = await extension_to_tools(extension)
+    # the extensions are independent, convert them concurrently
+    extension_tools = await asyncio.gather(
+        *[extension_to_tools(extension) for extension in builtin_extensions]
+    )
+    for tools in extension_tools:
         for tool in tools:
             extension_services[tool.__name__] = tool
     return extension_services
@@ -1,9 +1,15 @@
 import os
+import asyncio
 import requests
 import zipfile
 import shutil
+import functools
+import threading
+import faiss
+import numpy as np
 from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
@@ -12,7 +18,22 @@ import pickle
 from bioimageio_chatbot.utils import get_manifest, download_file
 
 
-def load_docs_store(db_path, collection_name):
+@functools.lru_cache(maxsize=None)
+def get_embeddings():
+    """Get the embeddings client shared by all the docs stores"""
+    return OpenAIEmbeddings()
+
+
+@functools.lru_cache(maxsize=4096)
+def embed_query(query):
+    """Embed a query once, the embedding is reused across docs stores and repeated queries"""
+    embedding = np.asarray(get_embeddings().embed_query(query), dtype="float32")
+    faiss.normalize_L2(embedding.reshape(1, -1))
+    embedding.setflags(write=False)
+    return embedding
+
+
+def load_docs_store(db_path, collection_name, embeddings=None):
     # Each collection has two files [collection_name].faiss and [collection_name].pkl
     # Check if it exists, otherwise, download from {KNOWLEDGE_BASE_URL}/[collection].faiss
     if not os.path.exists(os.path.join(db_path, f"{collection_name}.faiss")):
@@ -20,23 +41,75 @@ def load_docs_store(db_path, collection_name):
     if not os.path.exists(os.path.join(db_path, f"{collection_name}.pkl")):
         raise Exception(f"Please build the docs store {collection_name} by running create_vector_knowledge_base first.")
     # Load from vector store
-    embeddings = OpenAIEmbeddings()
-    docs_store = FAISS.load_local(index_name=collection_name, folder_path=db_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+    embeddings = embeddings or get_embeddings()
+    if os.environ.get("BIOIMAGEIO_FAISS_MMAP") == "1":
+        # Memory-map the index so only the pages touched by the search are loaded,
+        # IO_FLAG_MMAP_IFC maps both the vectors of flat indexes and the inverted lists
+        # of IVF indexes, older faiss versions only have IO_FLAG_MMAP for the IVF lists.
+        # The two flags must not be combined, faiss then fails to read IVF indexes
+        io_flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(db_path, f"{collection_name}.faiss"), io_flags)
+        with open(os.path.join(db_path, f"{collection_name}.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        docs_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    else:
+        docs_store = FAISS.load_local(index_name=collection_name, folder_path=db_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+    # The vectors are owned by the FAISS index, drop any copies kept in the document metadata
+    for doc in docs_store.docstore._dict.values():
+        doc.metadata.pop("embedding", None)
+    if docs_store.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        # The vectors are L2-normalized, the inner product is the cosine similarity
+        docs_store.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+        docs_store._normalize_L2 = True
+        docs_store.override_relevance_score_fn = lambda score: score
+    else:
+        # The embeddings and the queries are unit vectors, the squared L2 distance
+        # is 2 - 2 * cosine, so map it back to the cosine similarity to score all
+        # the docs stores on the same scale
+        docs_store.override_relevance_score_fn = lambda distance: 1.0 - distance / 2
+    if isinstance(docs_store.index, faiss.IndexIVF):
+        # Only scan the closest inverted lists instead of the whole index
+        docs_store.index.nprobe = int(os.environ.get("BIOIMAGEIO_FAISS_NPROBE", "16"))
+    elif isinstance(docs_store.index, faiss.IndexHNSW):
+        # Size of the candidate list explored in the HNSW graph per query
+        docs_store.index.hnsw.efSearch = int(os.environ.get("BIOIMAGEIO_FAISS_EF_SEARCH", "64"))
     return docs_store
 
 
-def load_knowledge_base(db_path):
-    collections = get_manifest()['collections']
+_docs_stores = {}
+_docs_store_locks = {}
+_docs_store_locks_lock = threading.Lock()
+
+
+def get_docs_store(db_path, collection_name):
+    """Load a docs store on first use and keep it for the lifetime of the process"""
+    key = (db_path, collection_name)
+    docs_store = _docs_stores.get(key)
+    if docs_store is not None:
+        return docs_store
+    # concurrent first searches of a channel wait for a single load instead of each loading the whole store
+    with _docs_store_locks_lock:
+        lock = _docs_store_locks.setdefault(key, threading.Lock())
+    with lock:
+        docs_store = _docs_stores.get(key)
+        if docs_store is None:
+            docs_store = load_docs_store(db_path, collection_name)
+            length = len(docs_store.docstore._dict.keys())
+            assert length > 0, f"Please make sure the docs store {collection_name} is not empty."
+            print(f"Loaded {length} documents from {collection_name}")
+            _docs_stores[key] = docs_store
+    return docs_store
+
+
+def load_knowledge_base(db_path, collections=None):
+    if collections is None:
+        collections = get_manifest()['collections']
     docs_store_dict = {}
     
     for collection in collections:
         channel_id = collection['id']
         try:
-            docs_store = load_docs_store(db_path, channel_id)
-            length = len(docs_store.docstore._dict.keys())
-            assert length > 0, f"Please make sure the docs store {channel_id} is not empty."
-            print(f"Loaded {length} documents from {channel_id}")
-            docs_store_dict[channel_id] = docs_store
+            docs_store_dict[channel_id] = get_docs_store(db_path, channel_id)
         except Exception as e:
             print(f"Failed to load docs store for {channel_id}. Error: {e}")
 
@@ -45,6 +118,87 @@ def load_knowledge_base(db_path):
 
     return docs_store_dict
 
+def measure_recall(index, xb, metric="l2", k=3, n_queries=200):
+    """Measure the top-k recall of an index against an exact search on the exact vectors `xb`,
+    using a sample of the vectors as queries with each query's own vector left out of the results"""
+    exact_index = faiss.IndexFlatIP(xb.shape[1]) if metric == "inner_product" else faiss.IndexFlatL2(xb.shape[1])
+    exact_index.add(xb)
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(xb), size=min(n_queries, len(xb)), replace=False)
+    xq = xb[query_ids]
+    # search one more neighbour since every query would otherwise trivially find itself
+    _, expected = exact_index.search(xq, k + 1)
+    _, retrieved = index.search(xq, k + 1)
+    hits = 0
+    total = 0
+    for query_id, e, r in zip(query_ids, expected, retrieved):
+        e = [i for i in e if i != query_id and i != -1][:k]
+        r = [i for i in r if i != query_id and i != -1][:k]
+        hits += len(set(e) & set(r))
+        total += len(e)
+    return hits / total if total else 1.0
+
+
+def rebuild_docs_store_index(db_path, collection_name, index_factory="IVF256,PQ32", metric="l2", min_recall=0.9):
+    """Rebuild the FAISS index of a docs store with an index created by `faiss.index_factory`"""
+    faiss.omp_set_num_threads(os.cpu_count())
+    docs_store = load_docs_store(db_path, collection_name)
+    # Always rebuild from the exact vectors, rebuilding from a quantized index would make the loss permanent
+    flat_index_path = os.path.join(db_path, f"{collection_name}.flat.faiss")
+    if os.path.exists(flat_index_path):
+        flat_index = faiss.read_index(flat_index_path)
+    elif isinstance(docs_store.index, faiss.IndexFlat):
+        flat_index = docs_store.index
+        faiss.write_index(flat_index, flat_index_path)
+    else:
+        raise Exception(f"The index of {collection_name} is not an exact flat index and {flat_index_path} is missing, please recreate the docs store by running create_vector_knowledge_base first.")
+    if flat_index.ntotal != len(docs_store.index_to_docstore_id):
+        raise Exception(f"{flat_index_path} does not match the docs store {collection_name}, please recreate the docs store by running create_vector_knowledge_base first.")
+    xb = flat_index.reconstruct_n(0, flat_index.ntotal)
+    d = xb.shape[1]
+    if metric == "inner_product":
+        # Normalize the vectors so that the inner product is the cosine similarity
+        faiss.normalize_L2(xb)
+        new_index = faiss.index_factory(d, index_factory, faiss.METRIC_INNER_PRODUCT)
+    else:
+        new_index = faiss.index_factory(d, index_factory)
+    try:
+        nlist = faiss.extract_index_ivf(new_index).nlist
+    except RuntimeError:
+        nlist = None
+    # faiss needs at least 39 training points per centroid to train the coarse quantizer
+    if nlist and len(xb) < nlist * 39:
+        print(f"Skipping {collection_name}: {len(xb)} vectors are too few to train {index_factory}.")
+        return docs_store
+    if isinstance(new_index, faiss.IndexHNSW):
+        new_index.hnsw.efConstruction = 200
+    if not new_index.is_trained:
+        new_index.train(xb)
+    new_index.add(xb)
+    if isinstance(new_index, faiss.IndexHNSW):
+        new_index.hnsw.efSearch = 64
+    elif isinstance(new_index, faiss.IndexIVF):
+        new_index.nprobe = 16
+    recall = measure_recall(new_index, xb, metric=metric)
+    if recall < min_recall:
+        print(f"Skipping {collection_name}: the top-3 recall of {index_factory} is {recall:.3f}, below {min_recall}.")
+        return docs_store
+    docs_store.index = new_index
+    docs_store.save_local(db_path, index_name=collection_name)
+    print(f"Rebuilt the index of {collection_name} with {index_factory}, metric: {metric}, top-3 recall: {recall:.3f} ({len(xb)} vectors)")
+    return docs_store
+
+
+def rebuild_knowledge_base_index(db_path, index_factory="IVF256,PQ32", metric="l2", min_recall=0.9):
+    collections = get_manifest()['collections']
+    for collection in collections:
+        channel_id = collection['id']
+        try:
+            rebuild_docs_store_index(db_path, channel_id, index_factory=index_factory, metric=metric, min_recall=min_recall)
+        except Exception as e:
+            print(f"Failed to rebuild the index for {channel_id}. Error: {e}")
+
+
 def extract_biotools_information(json_file_path):
     with open(json_file_path, 'r') as f:
         data = json.load(f)
@@ -151,6 +305,24 @@ def download_docs(root_dir, url):
     return result_folder
 
 
+async def aembed_documents_in_batches(embeddings, texts, batch_size=256, max_concurrency=4):
+    """Embed the texts in batches, with up to `max_concurrency` embedding requests in flight"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    total_length = len(texts)
+
+    async def embed_batch(batch_start):
+        batch_end = min(batch_start + batch_size, total_length)
+        async with semaphore:
+            batch_embeddings = await embeddings.aembed_documents(texts[batch_start:batch_end])
+        print(f"Processed {batch_end}/{total_length} documents")
+        return batch_embeddings
+
+    batches = await asyncio.gather(
+        *[embed_batch(batch_start) for batch_start in range(0, total_length, batch_size)]
+    )
+    return [embedding for batch_embeddings in batches for embedding in batch_embeddings]
+
+
 def create_vector_knowledge_base(output_dir=None, collections=None):
     """Create a vector knowledge base from the downloaded documents"""
     if output_dir is None:
@@ -160,7 +332,7 @@ def create_vector_knowledge_base(output_dir=None, collections=None):
     if not collections:
         collections = get_manifest()['collections']
     
-    embeddings = OpenAIEmbeddings()
+    embeddings = get_embeddings()
     for collection in collections:
         if collection.get("format") and collection.get("format").startswith("custom:"):
             print(f"Skipping {collection['id']} because it is a custom collection.")
@@ -178,34 +350,27 @@ def create_vector_knowledge_base(output_dir=None, collections=None):
         # save the vector db to output_dir
         print(f"Creating embeddings (#documents={len(documents)}))")
 
-        # Choose an appropriate batch size
-        batch_size = 1000 
-
-        # Initialize an empty list to store all the batch_embedding_pairs
-        all_embedding_pairs = []
-        all_metadata = []
-
-        total_length = len(documents)
-
-        # Loop over your documents in batches
-        for batch_start in range(0, total_length, batch_size):
-            batch_end = min(batch_start + batch_size, total_length)
-            batch_texts = documents[batch_start:batch_end]
-
-            # Generate embeddings for the batch of texts
-            batch_embeddings = embeddings.embed_documents([t.page_content for t in batch_texts])
-            batch_embedding_pairs = zip([t.page_content for t in batch_texts], batch_embeddings)
-
-            # Append the batch_embedding_pairs to the all_embedding_pairs list
-            all_embedding_pairs.extend(batch_embedding_pairs)
-            all_metadata.extend([t.metadata for t in batch_texts])
-
-            print(f"Processed {batch_end}/{total_length} documents")
+        texts = [t.page_content for t in documents]
+        # Embed the documents in batches, sending several batches concurrently
+        all_embeddings = asyncio.run(
+            aembed_documents_in_batches(
+                embeddings,
+                texts,
+                batch_size=collection.get('embedding_batch_size', 256),
+                max_concurrency=collection.get('embedding_concurrency', 4),
+            )
+        )
+        all_embedding_pairs = list(zip(texts, all_embeddings))
+        all_metadata = [t.metadata for t in documents]
 
         # Create the FAISS index from all the embeddings
         vectordb = FAISS.from_embeddings(all_embedding_pairs, embeddings, metadatas=all_metadata)
         print("Saving the vector database...")
         vectordb.save_local(output_dir, index_name=collection['id'])
+        # remove the exact copy kept by previous index rebuilds, it belongs to the old documents
+        flat_index_path = os.path.join(output_dir, collection['id'] + ".flat.faiss")
+        if os.path.exists(flat_index_path):
+            os.remove(flat_index_path)
         print("Created a vector database from the downloaded documents.")
 
 if __name__ == "__main__":
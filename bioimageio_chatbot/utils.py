@@ -2,6 +2,7 @@
 import requests
 import yaml
 import os
+import functools
 from tqdm import tqdm
 from pydantic import BaseModel, Field
 from typing import Callable, Optional
@@ -11,6 +12,7 @@ from typing import Any, Callable, Dict, Optional
 from bioimageio_chatbot.jsonschema_pydantic import json_schema_to_pydantic_model
 from schema_agents import schema_tool
 
+@functools.lru_cache(maxsize=None)
 def get_manifest():
     # If no manifest is provided, download from the repo
     if not os.path.exists("./knowledge-base-manifest.yaml"):
@@ -20,7 +22,10 @@ def get_manifest():
         with open("./knowledge-base-manifest.yaml", "wb") as f:
             f.write(response.content)
     
-    return yaml.load(open("./knowledge-base-manifest.yaml", "r"), Loader=yaml.FullLoader)
+    # Use the libyaml based loader if available, the manifest is parsed once per process
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open("./knowledge-base-manifest.yaml", "r") as f:
+        return yaml.load(f, Loader=loader)
 
 
 def download_file(url, filename):
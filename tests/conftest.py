@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+
+class NormalizedFakeEmbedding(DeterministicFakeEmbedding):
+    """Fake embeddings returning unit vectors, like the OpenAI embeddings"""
+
+    def _get_embedding(self, seed):
+        embedding = np.array(super()._get_embedding(seed))
+        return list(embedding / np.linalg.norm(embedding))
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    """Replace the OpenAI embeddings of the knowledge base with fake embeddings"""
+    from bioimageio_chatbot import knowledge_base
+    embeddings = NormalizedFakeEmbedding(size=32)
+    monkeypatch.setattr(knowledge_base, "get_embeddings", lambda: embeddings)
+    knowledge_base.embed_query.cache_clear()
+    yield embeddings
+    knowledge_base.embed_query.cache_clear()
@@ -0,0 +1,80 @@
+import pytest
+from langchain_community.vectorstores import FAISS
+from bioimageio_chatbot.knowledge_base import load_docs_store
+from bioimageio_chatbot.chatbot_extensions import docs_extension
+from bioimageio_chatbot.chatbot_extensions.docs_extension import search_docs_store, query_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    query_cache.clear()
+    yield
+    query_cache.clear()
+
+
+@pytest.fixture
+def docs_store_loaders(tmp_path, embeddings):
+    channels = {
+        "bioimage.io": [f"bioimage.io document {i}" for i in range(20)],
+        "ilastik": [f"ilastik document {i}" for i in range(20)],
+    }
+    loaders = {}
+    for channel_id, texts in channels.items():
+        FAISS.from_texts(texts, embeddings, metadatas=[{"source": text} for text in texts]).save_local(str(tmp_path), index_name=channel_id)
+        docs_store = load_docs_store(str(tmp_path), channel_id, embeddings)
+        loaders[channel_id] = lambda docs_store=docs_store: docs_store
+    return loaders
+
+
+@pytest.mark.asyncio
+async def test_search_docs_store(docs_store_loaders):
+    """Test returning the results of a docs store as parallel lists"""
+    results = await search_docs_store(docs_store_loaders, "ilastik", "ilastik document 3", 5, base_url="https://www.ilastik.org")
+    assert results["docs"][0] == "ilastik document 3"
+    assert results["metadatas"][0] == {"source": "ilastik document 3"}
+    assert results["channels"] == ["ilastik"] * 5
+    assert results["base_url"] == "https://www.ilastik.org"
+    assert len(results["docs"]) == len(results["scores"]) == len(results["metadatas"]) == 5
+
+    # top_k defaults to 3 when the search is not called through the tool
+    results = await search_docs_store(docs_store_loaders, "ilastik", "ilastik document 4")
+    assert len(results["docs"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_search_all_docs_stores(docs_store_loaders):
+    """Test merging the results of all the docs stores by relevance score"""
+    results = await search_docs_store(docs_store_loaders, None, "bioimage.io document 7", 10)
+    assert results["docs"][0] == "bioimage.io document 7"
+    assert results["channels"][0] == "bioimage.io"
+    assert results["scores"] == sorted(results["scores"], reverse=True)
+    assert len(results["docs"]) == len(results["scores"]) == len(results["metadatas"]) == len(results["channels"]) == 10
+    # the merged results come from the top results of each channel
+    assert set(results["channels"]) <= {"bioimage.io", "ilastik"}
+
+
+@pytest.mark.asyncio
+async def test_search_all_docs_stores_skips_failing_channel(docs_store_loaders):
+    """Test that a docs store failing to load does not fail the search of the other ones"""
+
+    def load_broken_docs_store():
+        raise Exception("Please build the docs store broken by running create_vector_knowledge_base first.")
+
+    results = await search_docs_store({**docs_store_loaders, "broken": load_broken_docs_store}, None, "ilastik document 1", 3)
+    assert results["docs"][0] == "ilastik document 1"
+    assert "broken" not in results["channels"]
+    # the partial results are not cached, the search is retried on all the channels
+    assert query_cache.stats()["size"] == 0
+    with pytest.raises(Exception):
+        await search_docs_store({"broken": load_broken_docs_store}, None, "ilastik document 1", 3)
+
+
+@pytest.mark.asyncio
+async def test_search_docs_store_min_relevance(docs_store_loaders, monkeypatch):
+    """Test that no document is returned when none of them reaches the minimum relevance"""
+    monkeypatch.setattr(docs_extension, "MIN_RELEVANCE", 1.5)
+    results = await search_docs_store(docs_store_loaders, None, "bioimage.io document 7", 10)
+    assert results["docs"] == ["No relevant documentation found."]
+    assert results["scores"] == [0.0]
+    assert results["metadatas"] == [{}]
+    assert results["channels"] == [None]
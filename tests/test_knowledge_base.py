@@ -1,9 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_openai import OpenAIEmbeddings
+from bioimageio_chatbot import knowledge_base
+from bioimageio_chatbot.knowledge_base import load_docs_store, get_docs_store
 
 def test_knowledge_base():
     """Test the knowledge base"""
     vectordb = FAISS.load_local(folder_path="./bioimageio-knowledge-base", index_name="bioimage.io", embeddings=OpenAIEmbeddings(), allow_dangerous_deserialization=True)
     retriever = vectordb.as_retriever(score_threshold=0.4)
     items = retriever.get_relevant_documents("community partner", verbose=True)
-    assert len(items) > 0
\ No newline at end of file
+    assert len(items) > 0
+
+def test_load_docs_store_cosine_scores(tmp_path, embeddings):
+    """Test that the L2 and inner product docs stores are scored with the same cosine similarity"""
+    texts = [f"bioimage.io document {i}" for i in range(20)]
+    FAISS.from_texts(texts, embeddings).save_local(str(tmp_path), index_name="l2")
+    FAISS.from_texts(texts, embeddings, distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT).save_local(str(tmp_path), index_name="inner_product")
+    l2_results = load_docs_store(str(tmp_path), "l2").similarity_search_with_relevance_scores("bioimage.io document 3", k=5, score_threshold=-1.0)
+    ip_results = load_docs_store(str(tmp_path), "inner_product").similarity_search_with_relevance_scores("bioimage.io document 3", k=5, score_threshold=-1.0)
+    assert l2_results[0][0].page_content == "bioimage.io document 3"
+    assert l2_results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [doc.page_content for doc, _ in l2_results] == [doc.page_content for doc, _ in ip_results]
+    assert [score for _, score in l2_results] == pytest.approx([score for _, score in ip_results], abs=1e-5)
+
+
+def test_get_docs_store_loads_once(tmp_path, embeddings, monkeypatch):
+    """Test that concurrent first searches of a channel load its docs store only once"""
+    FAISS.from_texts([f"bioimage.io document {i}" for i in range(20)], embeddings).save_local(str(tmp_path), index_name="bioimage.io")
+    loaded = []
+
+    def slow_load_docs_store(db_path, collection_name):
+        loaded.append(collection_name)
+        time.sleep(0.2)
+        return load_docs_store(db_path, collection_name)
+
+    monkeypatch.setattr(knowledge_base, "load_docs_store", slow_load_docs_store)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        docs_stores = list(pool.map(lambda _: get_docs_store(str(tmp_path), "bioimage.io"), range(4)))
+    assert loaded == ["bioimage.io"]
+    assert all(docs_store is docs_stores[0] for docs_store in docs_stores)
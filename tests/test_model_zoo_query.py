@@ -0,0 +1,68 @@
+import os
+import re
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+PLUGIN_PATH = os.path.join(dir_path, "..", "bioimageio_chatbot", "static", "bioimage-model-zoo-extension.imjoy.html")
+
+RESOURCE_ITEMS = [
+    {"id": "affable-shark", "name": "NucleiSegmentationBoundaryModel", "type": "model", "tags": ["Nuclei", "unet", "segmentation"], "download_count": 120},
+    {"id": "hiding-tiger", "name": "LiveCellSegmentationBoundaryModel", "type": "model", "tags": ["cells", "unet", "segmentation"], "download_count": 30},
+    {"id": "ilastik/ilastik", "name": "ilastik", "type": "application", "tags": ["ilastik", "segmentation"]},
+    {"id": "ilastik/covid_if_training_data", "name": "Covid-IF Training Data", "type": "dataset", "tags": ["nuclei", "covid"]},
+]
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    """Run the python code of the plugin outside of pyodide"""
+    with open(PLUGIN_PATH, encoding="utf-8") as f:
+        source = re.search(r'<script lang="python">(.*?)</script>', f.read(), re.DOTALL).group(1)
+    monkeypatch.setitem(sys.modules, "imjoy", SimpleNamespace(api=MagicMock()))
+    monkeypatch.setitem(sys.modules, "js", SimpleNamespace(fetch=MagicMock()))
+    namespace = {}
+    exec(source, namespace)
+    return SimpleNamespace(**namespace)
+
+
+def make_query(filters=(), project=("id", "name", "type"), group_by=None, limit=10):
+    return SimpleNamespace(
+        filters=[SimpleNamespace(field=field, op=op, value=value) for field, op, value in filters],
+        project=list(project),
+        group_by=group_by,
+        limit=limit,
+    )
+
+
+def test_execute_query_filters(plugin):
+    """Test filtering and projecting the resource items"""
+    df, tags = plugin.create_resource_table(RESOURCE_ITEMS)
+    result = plugin.execute_query(make_query([("type", "eq", "model"), ("tags", "has_tag", "nuclei")]), df, tags)
+    assert result == {"count": 1, "items": [{"id": "affable-shark", "name": "NucleiSegmentationBoundaryModel", "type": "model"}]}
+
+    result = plugin.execute_query(make_query([("name", "contains", "SEGMENTATION"), ("download_count", "ne", 120)], project=["id", "download_count"]), df, tags)
+    assert result == {"count": 1, "items": [{"id": "hiding-tiger", "download_count": 30}]}
+
+    # missing fields are returned as None
+    result = plugin.execute_query(make_query([("type", "eq", "application")], project=["id", "download_count"]), df, tags)
+    assert result["items"] == [{"id": "ilastik/ilastik", "download_count": None}]
+
+
+def test_execute_query_group_by(plugin):
+    """Test counting the resource items per value of a field or per tag"""
+    df, tags = plugin.create_resource_table(RESOURCE_ITEMS)
+    result = plugin.execute_query(make_query(group_by="type"), df, tags)
+    assert result == {"count": 4, "counts": {"model": 2, "application": 1, "dataset": 1}}
+
+    result = plugin.execute_query(make_query([("type", "ne", "dataset")], group_by="tags", limit=1), df, tags)
+    assert result == {"count": 3, "counts": {"segmentation": 3}}
+
+
+def test_execute_query_error(plugin):
+    """Test that invalid queries return an error instead of raising"""
+    df, tags = plugin.create_resource_table(RESOURCE_ITEMS)
+    result = plugin.execute_query(make_query([("license", "eq", "MIT")]), df, tags)
+    assert "error" in result
@@ -0,0 +1,19 @@
+import time
+from bioimageio_chatbot.chatbot_extensions.query_cache import QueryCache
+
+def test_query_cache():
+    """Test the LRU eviction and TTL expiration of the query cache"""
+    cache = QueryCache(max_size=2, ttl=0.1)
+    cache.put(("bioimage.io", "community partner", 3), ["doc1"])
+    cache.put(("ilastik", "pixel classification", 3), ["doc2"])
+    assert cache.get(("bioimage.io", "community partner", 3)) == ["doc1"]
+    # inserting a third entry evicts the least recently used one
+    cache.put(("imagej.net", "fiji plugins", 3), ["doc3"])
+    assert cache.get(("ilastik", "pixel classification", 3)) is None
+    assert cache.get(("bioimage.io", "community partner", 3)) == ["doc1"]
+    time.sleep(0.2)
+    assert cache.get(("imagej.net", "fiji plugins", 3)) is None
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 2
@@ -0,0 +1,74 @@
+import os
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from bioimageio_chatbot.knowledge_base import load_docs_store, rebuild_docs_store_index, measure_recall
+
+
+@pytest.fixture
+def db_path(tmp_path, embeddings):
+    texts = [f"bioimage.io document {i}" for i in range(300)]
+    FAISS.from_texts(texts, embeddings).save_local(str(tmp_path), index_name="bioimage.io")
+    return str(tmp_path)
+
+
+def test_rebuild_docs_store_index(db_path):
+    """Test rebuilding a docs store with an approximate index from the exact vectors"""
+    docs_store = rebuild_docs_store_index(db_path, "bioimage.io", index_factory="HNSW16", min_recall=0.9)
+    assert isinstance(docs_store.index, faiss.IndexHNSW)
+    flat_index = faiss.read_index(os.path.join(db_path, "bioimage.io.flat.faiss"))
+    assert isinstance(flat_index, faiss.IndexFlat)
+    assert flat_index.ntotal == 300
+
+    docs_store = load_docs_store(db_path, "bioimage.io")
+    assert isinstance(docs_store.index, faiss.IndexHNSW)
+    doc, _ = docs_store.similarity_search_with_score("bioimage.io document 42", k=1)[0]
+    assert doc.page_content == "bioimage.io document 42"
+
+    # rebuilding again starts from the exact vectors, not from the HNSW index
+    docs_store = rebuild_docs_store_index(db_path, "bioimage.io", index_factory="Flat", metric="inner_product")
+    assert isinstance(docs_store.index, faiss.IndexFlat)
+    assert docs_store.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def test_rebuild_docs_store_index_without_flat_vectors(db_path):
+    """Test refusing to rebuild a docs store whose exact vectors are lost"""
+    rebuild_docs_store_index(db_path, "bioimage.io", index_factory="HNSW16", min_recall=0.9)
+    os.remove(os.path.join(db_path, "bioimage.io.flat.faiss"))
+    with pytest.raises(Exception):
+        rebuild_docs_store_index(db_path, "bioimage.io", index_factory="HNSW16")
+
+
+def test_rebuild_docs_store_index_min_recall(db_path):
+    """Test keeping the current index when the new index does not reach the minimum recall"""
+    docs_store = rebuild_docs_store_index(db_path, "bioimage.io", index_factory="PQ4x4", min_recall=0.99)
+    assert isinstance(docs_store.index, faiss.IndexFlat)
+    assert isinstance(load_docs_store(db_path, "bioimage.io").index, faiss.IndexFlat)
+
+
+def test_measure_recall():
+    """Test that the recall is not inflated by the queries finding themselves"""
+    xb = np.random.default_rng(0).standard_normal((1000, 32)).astype("float32")
+    flat_index = faiss.IndexFlatL2(32)
+    flat_index.add(xb)
+    assert measure_recall(flat_index, xb) == pytest.approx(1.0)
+    pq_index = faiss.index_factory(32, "PQ4x4")
+    pq_index.train(xb)
+    pq_index.add(xb)
+    assert measure_recall(pq_index, xb) < 0.9
+
+
+def test_load_docs_store_mmap(db_path, monkeypatch):
+    """Test loading memory-mapped flat and rebuilt IVF docs stores"""
+    monkeypatch.setenv("BIOIMAGEIO_FAISS_MMAP", "1")
+    docs_store = load_docs_store(db_path, "bioimage.io")
+    assert isinstance(docs_store.index, faiss.IndexFlat)
+    doc, _ = docs_store.similarity_search_with_score("bioimage.io document 42", k=1)[0]
+    assert doc.page_content == "bioimage.io document 42"
+
+    rebuild_docs_store_index(db_path, "bioimage.io", index_factory="IVF4,Flat", min_recall=0.9)
+    docs_store = load_docs_store(db_path, "bioimage.io")
+    assert isinstance(docs_store.index, faiss.IndexIVF)
+    doc, _ = docs_store.similarity_search_with_score("bioimage.io document 42", k=1)[0]
+    assert doc.page_content == "bioimage.io document 42"